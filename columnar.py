@@ -0,0 +1,170 @@
+import sys
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# this module writes the count, HMM and SV tables as Arrow IPC or Parquet instead of TSV
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+VCF_COLUMNS = ['CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT']
+
+
+def is_columnar_path(path):
+    """
+    Check whether an output path asks for a columnar format.
+
+    Parameters:
+    path (str): Output file path.
+
+    Returns:
+    bool: True if the extension is a Parquet or Arrow IPC extension.
+    """
+    return path.endswith(PARQUET_EXTENSIONS + ARROW_EXTENSIONS)
+
+
+class ColumnarWriter:
+    """
+    Streams rows to an Arrow IPC file or a Parquet file in record batches.
+
+    Columns listed in dictionary_columns are dictionary-encoded. Each such column keeps
+    one growing dictionary for the whole file, so every batch only adds new values and
+    the IPC file stays readable with a single dictionary per field.
+
+    Parameters:
+    path (str): Output path, the format is chosen from the extension.
+    columns (list): List of (name, type) tuples, type is 'string', 'int64' or 'float64'.
+    dictionary_columns (iterable): Names of string columns to dictionary-encode.
+    batch_size (int): Number of rows buffered before a record batch is written.
+    """
+
+    def __init__(self, path, columns, dictionary_columns=(), batch_size=65536):
+        if pa is None:
+            print("Error: pyarrow is required for Arrow/Parquet output.", file=sys.stderr)
+            sys.exit(1)
+        if not is_columnar_path(path):
+            print(f"Error: {path} does not have a Parquet or Arrow extension.", file=sys.stderr)
+            sys.exit(1)
+
+        self.path = path
+        self.names = [name for name, _ in columns]
+        self.batch_size = batch_size
+        self.dictionary_columns = set(dictionary_columns)
+        self.dictionaries = {name: {} for name in self.dictionary_columns}
+        self.buffer = [[] for _ in columns]
+
+        fields = []
+        for name, col_type in columns:
+            if name in self.dictionary_columns:
+                fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+            else:
+                fields.append(pa.field(name, {'string': pa.string(), 'int64': pa.int64(), 'float64': pa.float64()}[col_type]))
+        self.schema = pa.schema(fields)
+
+        if path.endswith(PARQUET_EXTENSIONS):
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            options = ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self.writer = ipc.new_file(path, self.schema, options=options)
+
+    def write_row(self, row):
+        for column, value in zip(self.buffer, row):
+            column.append(value)
+        if len(self.buffer[0]) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def _encode(self, name, values):
+        dictionary = self.dictionaries[name]
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            index = dictionary.get(value)
+            if index is None:
+                index = len(dictionary)
+                dictionary[value] = index
+            indices.append(index)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(list(dictionary), type=pa.string()))
+
+    def flush(self):
+        if not self.buffer[0]:
+            return
+        arrays = []
+        for field, values in zip(self.schema, self.buffer):
+            if field.name in self.dictionary_columns:
+                arrays.append(self._encode(field.name, values))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        batch = pa.record_batch(arrays, schema=self.schema)
+        self.writer.write_batch(batch)
+        self.buffer = [[] for _ in self.names]
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_count_table(output_path, region_snp_counts):
+    """
+    Writes the SNP counts within each region with the same columns as count.write_tsv.
+
+    Parameters:
+    output_path (str): Path to the .parquet or .arrow output file.
+    region_snp_counts (iterable): Tuples of (chrom, start, end, gt_0_0, gt_0_1, gt_1_1).
+    """
+    columns = [('Chromosome', 'string'), ('Start', 'int64'), ('End', 'int64'),
+               ('GT_0/0', 'int64'), ('GT_0/1', 'int64'), ('GT_1/1', 'int64')]
+    with ColumnarWriter(output_path, columns, dictionary_columns=['Chromosome']) as writer:
+        writer.write_rows(region_snp_counts)
+
+
+def write_hmm_states(output_path, chromosome, positions, states):
+    """
+    Writes the Viterbi state for every decoded position.
+
+    Parameters:
+    output_path (str): Path to the .parquet or .arrow output file.
+    chromosome (str): Chromosome that was decoded.
+    positions (iterable): Sorted positions that were decoded.
+    states (iterable): Most likely state for each position.
+    """
+    columns = [('Chromosome', 'string'), ('Position', 'int64'), ('State', 'string')]
+    with ColumnarWriter(output_path, columns, dictionary_columns=['Chromosome', 'State']) as writer:
+        for pos, state in zip(positions, states):
+            writer.write_row((chromosome, pos, state))
+
+
+def write_vcf_table(output_path, sample_names, records):
+    """
+    Writes VCF records as a table with the VCF column names and one column per sample.
+
+    CHROM, FILTER, FORMAT and the sample genotype columns are dictionary-encoded.
+
+    Parameters:
+    output_path (str): Path to the .parquet or .arrow output file.
+    sample_names (list): Sample column names in VCF order.
+    records (iterable): VCF records, either split into fields or as tab-separated lines.
+    """
+    columns = [(name, 'int64' if name == 'POS' else 'string') for name in VCF_COLUMNS]
+    columns += [(name, 'string') for name in sample_names]
+    dictionary_columns = ['CHROM', 'FILTER', 'FORMAT'] + list(sample_names)
+    with ColumnarWriter(output_path, columns, dictionary_columns=dictionary_columns) as writer:
+        for record in records:
+            fields = record.rstrip('\n').split('\t') if isinstance(record, str) else list(record)
+            fields[1] = int(fields[1])
+            writer.write_row(fields)
@@ -1,5 +1,8 @@
 import sys
 
+from columnar import is_columnar_path, write_count_table
+from variantclient import query_server
+
 def read_bed_file(bed_file):
     """
     Reads a BED file and returns a list of regions.
@@ -86,8 +89,15 @@ if __name__ == '__main__':
     # Read BED file and get regions
     bed_regions = read_bed_file(input_bed)
 
-    # Count SNPs in each region
-    region_snp_counts = count_snps_in_region(input_vcf, bed_regions)
-
-    # Write results to TSV file
-    write_tsv(output_tsv, region_snp_counts)
+    # Count SNPs in each region, through the variant server if one is running
+    results = query_server([{'op': 'region_counts', 'vcf': input_vcf, 'regions': bed_regions}])
+    if results is not None:
+        region_snp_counts = [tuple(row) for row in results[0]]
+    else:
+        region_snp_counts = count_snps_in_region(input_vcf, bed_regions)
+
+    # Write results to TSV file, or to Arrow/Parquet if the output has that extension
+    if is_columnar_path(output_tsv):
+        write_count_table(output_tsv, region_snp_counts)
+    else:
+        write_tsv(output_tsv, region_snp_counts)
@@ -22,9 +22,9 @@ if [ ! -f "$reference_genome" ] || [ ! -f "$input_vcf" ] || [ ! -f "$sorted_bam"
     exit 1
 fi
 
-# Run FreeBayes for variant calling
+# Run FreeBayes for variant calling, sharded over the reference contigs on all requested CPUs
 echo "Running FreeBayes for variant calling..."
-freebayes -f "$reference_genome" -@ "$input_vcf" "$sorted_bam" > "$output_vcf" 2>&1
+python freebayesparallel.py "$reference_genome" "$sorted_bam" "${reference_genome}.fai" "$output_vcf" "${output_vcf%.vcf}_shards" "${SLURM_CPUS_PER_TASK:-8}" "$input_vcf"
 
 # Check if FreeBayes was successful
 if [ $? -ne 0 ]; then
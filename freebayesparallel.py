@@ -0,0 +1,250 @@
+import sys
+import os
+import heapq
+import hashlib
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+# this script splits the target regions into shards, runs freebayes on each shard in parallel
+# and merges the shard VCFs back into one coordinate-ordered VCF
+
+def read_regions(regions_file):
+    """
+    Reads target regions from a BED file or a FASTA index.
+
+    A file ending in .fai is read as (chromosome, length) and covers each whole contig,
+    anything else is read as a BED file with 0-based half-open intervals.
+
+    Parameters:
+    regions_file (str): Path to a BED file or a .fai index.
+
+    Returns:
+    list: List of (chromosome, start, end) tuples in file order.
+    """
+    regions = []
+    with open(regions_file, 'r') as f:
+        for line in f:
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            parts = line.strip().split('\t')
+            if regions_file.endswith('.fai'):
+                regions.append((parts[0], 0, int(parts[1])))
+            else:
+                regions.append((parts[0], int(parts[1]), int(parts[2])))
+    return regions
+
+def contig_order(regions):
+    """
+    Returns the rank of each contig in the order it first appears in the regions.
+    """
+    order = {}
+    for chrom, _, _ in regions:
+        if chrom not in order:
+            order[chrom] = len(order)
+    return order
+
+def make_shards(regions, n_shards):
+    """
+    Splits regions into shards of roughly equal total length.
+
+    Regions are cut into pieces no longer than the target shard size and consecutive
+    pieces are packed together, so every shard is a run of regions in coordinate order.
+
+    Parameters:
+    regions (list): List of (chromosome, start, end) tuples.
+    n_shards (int): Number of shards wanted.
+
+    Returns:
+    list: List of shards, each a list of (chromosome, start, end) tuples.
+    """
+    order = contig_order(regions)
+    regions = sorted(regions, key=lambda r: (order[r[0]], r[1], r[2]))
+    total = sum(end - start for _, start, end in regions)
+    if total == 0:
+        return []
+    target = -(-total // n_shards)
+
+    shards = []
+    current = []
+    current_size = 0
+    for chrom, start, end in regions:
+        while start < end:
+            piece_end = min(end, start + target - current_size)
+            current.append((chrom, start, piece_end))
+            current_size += piece_end - start
+            start = piece_end
+            if current_size >= target:
+                shards.append(current)
+                current = []
+                current_size = 0
+    if current:
+        shards.append(current)
+    return shards
+
+def run_freebayes(reference, bam, targets_bed, output_vcf, variant_input=None):
+    """
+    Runs freebayes on the regions in targets_bed and writes the calls to output_vcf.
+
+    Parameters:
+    reference (str): Reference FASTA.
+    bam (str): Sorted, indexed BAM file.
+    targets_bed (str): BED file with the regions of this shard.
+    output_vcf (str): VCF file to write.
+    variant_input (str): Optional VCF passed to freebayes with -@.
+    """
+    command = ['freebayes', '-f', reference, '-t', targets_bed]
+    if variant_input:
+        command += ['-@', variant_input]
+    command.append(bam)
+    with open(output_vcf, 'w') as out:
+        subprocess.run(command, stdout=out, check=True)
+
+def shard_prefix(work_dir, reference, bam, shard, variant_input=None):
+    """
+    Names the files of a shard after a hash of its regions and inputs.
+
+    A rerun with a different shard plan, for example with another number of workers,
+    then gets new file names instead of reusing VCFs that cover other regions.
+    """
+    digest = hashlib.sha1()
+    for value in (reference, bam, variant_input or ''):
+        digest.update(os.path.abspath(value).encode() if value else b'')
+        digest.update(b'\0')
+    for chrom, start, end in shard:
+        digest.update(f"{chrom}\t{start}\t{end}\n".encode())
+    return os.path.join(work_dir, f"shard_{digest.hexdigest()[:16]}")
+
+def run_shard(caller, reference, bam, shard, prefix, variant_input=None):
+    """
+    Runs the caller on one shard unless its VCF is already complete.
+
+    The VCF is written to a temporary name and renamed when the caller returns, so an
+    existing shard VCF always comes from a finished run.
+
+    Returns:
+    str: Path to the shard VCF.
+    """
+    shard_vcf = prefix + '.vcf'
+    if os.path.exists(shard_vcf):
+        return shard_vcf
+
+    targets_bed = prefix + '.bed'
+    with open(targets_bed, 'w') as bed:
+        for chrom, start, end in shard:
+            bed.write(f"{chrom}\t{start}\t{end}\n")
+
+    tmp_vcf = shard_vcf + '.tmp'
+    caller(reference, bam, targets_bed, tmp_vcf, variant_input)
+    os.replace(tmp_vcf, shard_vcf)
+    return shard_vcf
+
+def read_vcf_records(vcf_file, order):
+    """
+    Yields ((contig rank, position), line) for every record of a shard VCF.
+    """
+    with open(vcf_file, 'r') as vcf:
+        for line in vcf:
+            if line.startswith('#'):
+                continue
+            chrom, pos = line.split('\t', 2)[:2]
+            yield (order.get(chrom, len(order)), int(pos)), line
+
+def read_vcf_header(vcf_file):
+    header = []
+    with open(vcf_file, 'r') as vcf:
+        for line in vcf:
+            if not line.startswith('#'):
+                break
+            header.append(line)
+    return header
+
+def merge_shard_vcfs(shard_vcfs, output_vcf, order):
+    """
+    Merges shard VCFs into one VCF in coordinate order with the header of the first shard.
+
+    Records that several shards report at a shard boundary are written once; two records
+    are the same if CHROM, POS, REF and ALT are equal.
+
+    Parameters:
+    shard_vcfs (list): Shard VCF paths in shard order.
+    output_vcf (str): Merged VCF path.
+    order (dict): Rank of each contig.
+
+    Returns:
+    int: Number of records written.
+    """
+    written = 0
+    last_key = None
+    seen_at_key = set()
+    with open(output_vcf, 'w') as out:
+        if shard_vcfs:
+            out.writelines(read_vcf_header(shard_vcfs[0]))
+        streams = [read_vcf_records(vcf_file, order) for vcf_file in shard_vcfs]
+        for key, line in heapq.merge(*streams, key=lambda record: record[0]):
+            if key != last_key:
+                last_key = key
+                seen_at_key = set()
+            fields = line.split('\t', 5)
+            allele = (fields[3], fields[4])
+            if allele in seen_at_key:
+                continue
+            seen_at_key.add(allele)
+            out.write(line)
+            written += 1
+    return written
+
+def run_sharded(reference, bam, regions_file, output_vcf, work_dir, n_workers, variant_input=None, n_shards=None, caller=run_freebayes):
+    """
+    Runs the caller over all shards on a process pool and merges the results.
+
+    Shard files are named after their regions (see shard_prefix), and shards whose VCF
+    already exists in work_dir are skipped, so a rerun after a failure only calls the
+    unfinished shards and never reuses a VCF made for other regions. caller must be a
+    module-level function with the signature of run_freebayes so it can be sent to the
+    worker processes.
+
+    Parameters:
+    reference (str): Reference FASTA.
+    bam (str): Sorted, indexed BAM file.
+    regions_file (str): BED file or .fai index with the regions to call.
+    output_vcf (str): Merged VCF path.
+    work_dir (str): Directory for the shard BED and VCF files.
+    n_workers (int): Number of worker processes.
+    variant_input (str): Optional VCF passed to the caller.
+    n_shards (int): Number of shards, defaults to four per worker.
+    caller (callable): Function that calls variants on one shard.
+
+    Returns:
+    int: Number of records in the merged VCF.
+    """
+    regions = read_regions(regions_file)
+    order = contig_order(regions)
+    shards = make_shards(regions, n_shards or 4 * n_workers)
+    os.makedirs(work_dir, exist_ok=True)
+
+    prefixes = [shard_prefix(work_dir, reference, bam, shard, variant_input) for shard in shards]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(run_shard, caller, reference, bam, shard, prefix, variant_input)
+                   for shard, prefix in zip(shards, prefixes)]
+        shard_vcfs = [future.result() for future in futures]
+
+    return merge_shard_vcfs(shard_vcfs, output_vcf, order)
+
+def main():
+    if len(sys.argv) not in (7, 8):
+        print("Usage: python freebayesparallel.py <reference_fasta> <sorted_bam> <regions.bed|reference.fai> <output_vcf> <work_dir> <n_workers> [variant_input_vcf]")
+        sys.exit(1)
+
+    reference = sys.argv[1]
+    bam = sys.argv[2]
+    regions_file = sys.argv[3]
+    output_vcf = sys.argv[4]
+    work_dir = sys.argv[5]
+    n_workers = int(sys.argv[6])
+    variant_input = sys.argv[7] if len(sys.argv) == 8 else None
+
+    written = run_sharded(reference, bam, regions_file, output_vcf, work_dir, n_workers, variant_input)
+    print(f"Merged {written} records into {output_vcf}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+
+# integer genotype codes shared by the HMM scripts
+GT_MISSING = 0   # no record at this position
+GT_HOM_REF = 1   # 0/0
+GT_HET = 2       # 0/1
+GT_HOM_ALT = 3   # 1/1
+GT_OTHER = 4     # any other call, e.g. ./., 1/2 or a phased call
+N_GT_CODES = 5
+
+GT_LABELS = [None, '0/0', '0/1', '1/1', 'other']
+
+# observation codes, matching the observation labels of hmm.initialize_hmm_parameters
+OBS_EQUAL = 0
+OBS_NOT_EQUAL = 1
+OBS_NONE = 255   # no observation is emitted for the site
+OBS_LABELS = ['equal', 'not_equal']
+
+_GT_CODES = {'0/0': GT_HOM_REF, '0/1': GT_HET, '1/1': GT_HOM_ALT}
+_PHASED_GT_CODES = {'0|0': GT_HOM_REF, '0|1': GT_HET, '1|0': GT_HET, '1|1': GT_HOM_ALT}
+
+def genotype_code(genotype, unphase=False):
+    """
+    Converts a genotype string to its integer code.
+
+    Args:
+        genotype (str or None): Genotype string from the UG or GT field, None if the VCF
+            has no record at the position.
+        unphase (bool): Read phased calls such as 0|1 as their unphased genotype. By
+            default they are GT_OTHER, which is how the string rules in hmm.py treat them.
+
+    Returns:
+        int: One of the GT_* codes.
+    """
+    if genotype is None:
+        return GT_MISSING
+    code = _GT_CODES.get(genotype)
+    if code is None and unphase:
+        code = _PHASED_GT_CODES.get(genotype)
+    return GT_OTHER if code is None else code
+
+def observation_rule(pup1, b6, pup2, known_cast):
+    """
+    Decides the HMM observation for one site from the genotype codes of the four samples.
+
+    These are the rules of the original observation loop in hmm.py, written on codes.
+
+    Returns:
+        int: OBS_EQUAL, OBS_NOT_EQUAL or OBS_NONE.
+    """
+    cast_differs = OBS_NOT_EQUAL if known_cast == GT_HOM_ALT else OBS_EQUAL
+    if pup1 == GT_HET:
+        if b6 == GT_MISSING and pup2 == GT_HET:
+            return cast_differs
+        if b6 in (GT_MISSING, GT_HOM_REF) and pup2 in (GT_MISSING, GT_HOM_REF):
+            return cast_differs
+        return OBS_EQUAL
+    if pup1 == GT_HOM_ALT:
+        if pup2 in (GT_HET, GT_HOM_ALT):
+            return cast_differs
+        return OBS_EQUAL
+    if pup1 == GT_HOM_REF:
+        return OBS_EQUAL
+    return OBS_NONE
+
+def build_observation_table():
+    """
+    Evaluates observation_rule for every combination of codes.
+
+    Returns:
+        numpy.ndarray: uint8 table indexed by (pup1, b6, pup2, known_cast) codes.
+    """
+    table = np.empty((N_GT_CODES,) * 4, dtype=np.uint8)
+    for index in np.ndindex(table.shape):
+        table[index] = observation_rule(*index)
+    return table
+
+OBSERVATION_TABLE = build_observation_table()
+
+def encode_observations(pup1, b6, pup2, known_cast):
+    """
+    Looks up the observation of every site at once.
+
+    Args:
+        pup1, b6, pup2, known_cast (array-like): Genotype codes of each sample, aligned
+            on the same sites.
+
+    Returns:
+        numpy.ndarray: uint8 array of OBS_* codes, OBS_NONE where no observation is made.
+    """
+    return OBSERVATION_TABLE[np.asarray(pup1), np.asarray(b6), np.asarray(pup2), np.asarray(known_cast)]
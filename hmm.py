@@ -3,6 +3,13 @@ import gzip
 import os
 import math
 
+import numpy as np
+
+from columnar import write_hmm_states
+from genotypes import encode_observations, OBS_LABELS, OBS_NONE
+from snpstore import load_snp_store
+from variantclient import query_server
+
 def load_vcf(file_path, chromosome):
     if not os.path.exists(file_path):
         print(f"Error: The file {file_path} does not exist.", file=sys.stderr)
@@ -96,18 +103,300 @@ def viterbi(observed_sequence, states, start_prob, trans_prob, emit_prob):
     print(f"Final log probabilities: {V[n]}", file=sys.stderr)
     return path[state]
 
-def identify_b6_positions(pup1_snps, most_likely_states):
+def viterbi_batch(observations, mask, states, start_prob, trans_prob, emit_prob):
+    """
+    Decodes many pups at once on a shared grid of SNP sites.
+
+    The recursion is the same as viterbi, but each step is a NumPy operation over the
+    pup axis, so the Python loop runs once per site instead of once per site per pup.
+    Ties are broken towards the later state in states. viterbi breaks them by comparing
+    state names instead, so the two agree when states is sorted, as it is in
+    initialize_hmm_parameters.
+
+    Args:
+        observations (array-like): Pups x sites matrix of observation labels ('equal',
+            'not_equal') or of integer indices into the observation labels of emit_prob.
+            Any other value, None included, raises ValueError unless the site is masked.
+        mask (array-like or None): Pups x sites boolean matrix, True where the pup has no
+            call. Masked sites contribute no emission and take their state from the
+            neighbouring sites through the transitions.
+        states (List[str]): HMM states.
+        start_prob (Dict[str, float]): Start probability of each state.
+        trans_prob (Dict[str, Dict[str, float]]): Log transition probabilities.
+        emit_prob (Dict[str, Dict[str, float]]): Log emission probabilities.
+
+    Returns:
+        numpy.ndarray: Pups x sites matrix of state indices into states.
+    """
+    labels = list(emit_prob[states[0]].keys())
+    observations = np.asarray(observations)
+    if observations.dtype.kind in 'USO':
+        codes = np.full(observations.shape, -1, dtype=np.intp)
+        for index, label in enumerate(labels):
+            codes[observations == label] = index
+        unknown = codes < 0
+        if mask is not None:
+            unknown &= ~np.asarray(mask, dtype=bool)
+        if unknown.any():
+            raise ValueError(f"unknown observation {observations[unknown].tolist()[0]!r}, expected one of {labels}")
+        observations = codes
+
+    log_start = np.log([start_prob[state] for state in states])
+    log_trans = np.array([[trans_prob[prev][state] for state in states] for prev in states])
+    log_emit = np.array([[emit_prob[state].get(label, float('-inf')) for label in labels] for state in states])
+
+    return viterbi_matrices(observations, mask, log_start, log_trans, log_emit)
+
+def viterbi_matrices(observations, mask, log_start, log_trans, log_emit):
+    """
+    Vectorised Viterbi recursion on log-probability arrays, used by viterbi_batch.
+
+    Each step costs one K x K NumPy operation per pup, so the Python overhead does not
+    grow with the number of states K. Emissions are looked up one site at a time, so the
+    only pups x sites x K array kept is the backpointers, one byte each for K up to 127.
+
+    Args:
+        observations (array-like): Pups x sites matrix of observation indices.
+        mask (array-like or None): Pups x sites boolean matrix of missing calls.
+        log_start (numpy.ndarray): Length K log start probabilities.
+        log_trans (numpy.ndarray): K x K log transition probabilities, rows are the previous state.
+        log_emit (numpy.ndarray): K x M log emission probabilities.
+
+    Returns:
+        numpy.ndarray: Pups x sites matrix of state indices.
+    """
+    observations = np.asarray(observations)
+    n_pups, n_sites = observations.shape
+    n_states = len(log_start)
+    if n_sites == 0:
+        return np.empty((n_pups, 0), dtype=np.int16)
+    if observations.dtype.kind not in 'iu':
+        raise ValueError(f"observations must be integer indices, got dtype {observations.dtype}")
+    missing = None if mask is None else np.asarray(mask, dtype=bool)
+    n_observations = log_emit.shape[1]
+    if missing is None and (observations.min() < 0 or observations.max() >= n_observations):
+        bad = observations[(observations < 0) | (observations >= n_observations)][0]
+        raise ValueError(f"observation index {bad} out of range for {n_observations} observations")
+    emit_by_observation = np.ascontiguousarray(log_emit.T)
+
+    def emission(t):
+        # pups x states log emissions at site t, zero where the call is missing; masked
+        # sites may hold any value and are looked up as index 0
+        column = observations[:, t]
+        if missing is None:
+            return emit_by_observation[column]
+        invalid = ((column < 0) | (column >= n_observations)) & ~missing[:, t]
+        if invalid.any():
+            raise ValueError(f"observation index {column[invalid][0]} out of range for {n_observations} observations")
+        emissions = emit_by_observation[np.where(missing[:, t], 0, column)]
+        emissions[missing[:, t]] = 0.0
+        return emissions
+
+    backpointers = np.empty((n_sites, n_pups, n_states), dtype=np.int8 if n_states <= 127 else np.int16)
+    score = log_start + emission(0)
+    for t in range(1, n_sites):
+        candidates = score[:, :, None] + log_trans
+        # argmax over the reversed previous-state axis picks the last maximum
+        best_prev = n_states - 1 - candidates[:, ::-1, :].argmax(axis=1)
+        backpointers[t] = best_prev
+        score = candidates.max(axis=1) + emission(t)
+
+    paths = np.empty((n_pups, n_sites), dtype=np.int16)
+    paths[:, -1] = n_states - 1 - score[:, ::-1].argmax(axis=1)
+    pup_index = np.arange(n_pups)
+    for t in range(n_sites - 1, 0, -1):
+        paths[:, t - 1] = backpointers[t, pup_index, paths[:, t]]
+
+    return paths
+
+def state_segments(positions, state_path, states):
+    """
+    Collapses a decoded state path into runs of the same state.
+
+    Args:
+        positions (array-like): Sorted positions of the decoded sites.
+        state_path (array-like): State index for each position.
+        states (List[str]): HMM states.
+
+    Returns:
+        List[Tuple[int, int, str]]: Segments as (first position, last position, state).
+    """
+    positions = np.asarray(positions)
+    state_path = np.asarray(state_path)
+    if len(state_path) == 0:
+        return []
+    breaks = np.flatnonzero(state_path[1:] != state_path[:-1]) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(state_path)])) - 1
+    return [(int(positions[start]), int(positions[end]), states[state_path[start]]) for start, end in zip(starts, ends)]
+
+def decode_pups(observations, mask, positions, states, start_prob, trans_prob, emit_prob):
+    """
+    Runs viterbi_batch and returns the result per pup.
+
+    Args:
+        observations (array-like): Pups x sites matrix of observations, see viterbi_batch.
+        mask (array-like or None): Pups x sites boolean matrix of missing calls.
+        positions (array-like): Sorted positions shared by all pups.
+        states (List[str]): HMM states.
+        start_prob (Dict[str, float]): Start probability of each state.
+        trans_prob (Dict[str, Dict[str, float]]): Log transition probabilities.
+        emit_prob (Dict[str, Dict[str, float]]): Log emission probabilities.
+
+    Returns:
+        List[Tuple[numpy.ndarray, List[Tuple[int, int, str]]]]: For each pup, the state
+        index array and its segment list.
+    """
+    paths = viterbi_batch(observations, mask, states, start_prob, trans_prob, emit_prob)
+    return [(path, state_segments(positions, path, states)) for path in paths]
+
+def viterbi_stream(observations, states, start_prob, trans_prob, emit_prob, lag=10000):
+    """
+    Decodes a stream of observations with bounded memory, yielding states as they are fixed.
+
+    Backpointers are only kept for sites whose state is not yet decided. Once the
+    surviving paths of all states trace back to the same state at some site, that site
+    and everything before it cannot change and are yielded. Those states are the same as
+    viterbi would give for the whole sequence. If lag sites are still undecided, the
+    older half of them is committed along the currently best path instead, which may
+    differ from the full decode. Ties are broken towards the later state in states, which
+    matches viterbi when states is sorted (see viterbi_batch).
+
+    Paths are checked for merging when the undecided window reaches 1, 2, 4, 8, ...
+    sites, so the traceback work stays linear in the number of sites.
+
+    Args:
+        observations (iterable): (position, observation) pairs in position order. The
+            observation is a label of emit_prob, or None for a site without a call. Any
+            other observation raises ValueError.
+        states (List[str]): HMM states.
+        start_prob (Dict[str, float]): Start probability of each state.
+        trans_prob (Dict[str, Dict[str, float]]): Log transition probabilities.
+        emit_prob (Dict[str, Dict[str, float]]): Log emission probabilities.
+        lag (int): Maximum number of undecided sites held in memory.
+
+    Yields:
+        Tuple[int, str]: (position, state) in position order.
+    """
+    n_states = len(states)
+    labels = list(emit_prob[states[0]].keys())
+    label_index = {label: i for i, label in enumerate(labels)}
+    log_start = np.log([start_prob[state] for state in states])
+    log_trans = np.array([[trans_prob[prev][state] for state in states] for prev in states])
+    log_emit = np.array([[emit_prob[state].get(label, float('-inf')) for label in labels] for state in states])
+    no_emission = np.zeros(n_states)
+
+    def traceback(end_states, depth):
+        # follow the backpointers of several end states back over the newest depth sites
+        paths = [end_states]
+        current = end_states
+        for bp in reversed(backpointers[len(backpointers) - depth + 1:]):
+            current = bp[current]
+            paths.append(current)
+        return paths[::-1]
+
+    window_positions = []
+    backpointers = []
+    score = None
+    next_check = 1
+    for pos, observation in observations:
+        if observation is None:
+            emission = no_emission
+        elif observation in label_index:
+            emission = log_emit[:, label_index[observation]]
+        else:
+            raise ValueError(f"unknown observation {observation!r} at position {pos}, expected one of {labels}")
+        if score is None:
+            score = log_start + emission
+            backpointers.append(np.zeros(n_states, dtype=np.intp))
+        else:
+            candidates = score[:, None] + log_trans
+            best_prev = n_states - 1 - candidates[::-1, :].argmax(axis=0)
+            backpointers.append(best_prev)
+            score = candidates.max(axis=0) + emission
+        window_positions.append(pos)
+
+        if len(window_positions) >= lag:
+            best = n_states - 1 - int(score[::-1].argmax())
+            path = traceback(np.array([best]), len(window_positions))
+            n_commit = max(1, len(window_positions) // 2)
+            for i in range(n_commit):
+                yield window_positions[i], states[int(path[i][0])]
+        elif len(window_positions) >= next_check:
+            # find the newest site where the paths of all end states agree
+            paths = traceback(np.arange(n_states), len(window_positions))
+            n_commit = 0
+            for i in range(len(paths) - 1, -1, -1):
+                if np.all(paths[i] == paths[i][0]):
+                    n_commit = i + 1
+                    break
+            for i in range(n_commit):
+                yield window_positions[i], states[int(paths[i][0])]
+            next_check *= 2
+        else:
+            continue
+
+        if n_commit:
+            del window_positions[:n_commit]
+            del backpointers[:n_commit]
+            next_check = 1
+
+    if window_positions:
+        best = n_states - 1 - int(score[::-1].argmax())
+        path = traceback(np.array([best]), len(window_positions))
+        for pos, state_index in zip(window_positions, path):
+            yield pos, states[int(state_index[0])]
+
+def stream_segments(decoded):
+    """
+    Groups a stream of (position, state) pairs into segments as soon as each one ends.
+
+    Args:
+        decoded (iterable): (position, state) pairs in position order, e.g. from viterbi_stream.
+
+    Yields:
+        Tuple[int, int, str]: Segments as (first position, last position, state).
+    """
+    start = end = state = None
+    for pos, pos_state in decoded:
+        if pos_state != state:
+            if state is not None:
+                yield start, end, state
+            start, state = pos, pos_state
+        end = pos
+    if state is not None:
+        yield start, end, state
+
+def observation_sequence(b6_snps, pup1_snps, pup2_snps, known_cast_snps):
+    """
+    Builds the HMM observations at the pup1 positions from the four SNP stores.
+
+    Args:
+        b6_snps, pup1_snps, pup2_snps, known_cast_snps (SNPStore): Genotypes of one chromosome.
+
+    Returns:
+        Tuple[List[int], List[str]]: The pup1 positions that give an observation and the
+        'equal' or 'not_equal' observation at each of them.
+    """
+    positions = pup1_snps.positions
+    observation_codes = encode_observations(pup1_snps.codes, b6_snps.codes_at(positions),
+                                            pup2_snps.codes_at(positions), known_cast_snps.codes_at(positions))
+    observed = observation_codes != OBS_NONE
+    return positions[observed].tolist(), [OBS_LABELS[code] for code in observation_codes[observed]]
+
+def identify_b6_positions(positions, most_likely_states):
+    # positions are the sites that gave an observation, one per decoded state
     b6_positions = []
 
-    for pos, state in zip(sorted(pup1_snps.keys()), most_likely_states):
+    for pos, state in zip(positions, most_likely_states):
         if state == 'B6':
             b6_positions.append(pos)
 
     return b6_positions
 
 if __name__ == "__main__":
-    if len(sys.argv) != 6:
-        print("Usage: python3 identify_b6_positions.py <B6_father_vcf> <pup1_vcf> <pup2_vcf> <chromosome> <known_cast_vcf>", file=sys.stderr)
+    if len(sys.argv) not in (6, 7):
+        print("Usage: python3 identify_b6_positions.py <B6_father_vcf> <pup1_vcf> <pup2_vcf> <chromosome> <known_cast_vcf> [states.parquet|states.arrow]", file=sys.stderr)
         sys.exit(1)
     
     b6_father_vcf = sys.argv[1]
@@ -115,68 +404,48 @@ if __name__ == "__main__":
     pup2_vcf = sys.argv[3]
     chromosome = sys.argv[4]
     known_cast_vcf = sys.argv[5]
+    states_output = sys.argv[6] if len(sys.argv) == 7 else None
 
     print(f"Processing chromosome: {chromosome}", file=sys.stderr)
 
-    b6_snps, _ = load_vcf(b6_father_vcf, chromosome)
-    pup1_snps, _ = load_vcf(pup1_vcf, chromosome)
-    pup2_snps, _ = load_vcf(pup2_vcf, chromosome)
-    known_cast_snps, _ = load_vcf(known_cast_vcf, chromosome)
-
-    print(f"Loaded {len(b6_snps)} SNPs from B6 father VCF", file=sys.stderr)
-    print(f"Loaded {len(pup1_snps)} SNPs from pup1 VCF", file=sys.stderr)
-    print(f"Loaded {len(pup2_snps)} SNPs from pup2 VCF", file=sys.stderr)
-    print(f"Loaded {len(known_cast_snps)} SNPs from known CAST VCF", file=sys.stderr)
-
-    states, trans_prob, emit_prob = initialize_hmm_parameters()
-
-    observed_sequence = []
-    for pos in sorted(pup1_snps.keys()):
-        pup1_ug = pup1_snps[pos]['unphased_genotype']
-        b6_ug = b6_snps[pos]['unphased_genotype'] if pos in b6_snps else None
-        pup2_ug = pup2_snps[pos]['unphased_genotype'] if pos in pup2_snps else None
-        known_cast = known_cast_snps.get(pos, {}).get('unphased_genotype')
-
-        print(f"Position: {pos}, pup1_ug: {pup1_ug}, b6_ug: {b6_ug}, pup2_ug: {pup2_ug}, known_cast: {known_cast}", file=sys.stderr)
-
-        if pup1_ug == '0/1':
-            if (b6_ug is None) and (pup2_ug == '0/1'):
-                if known_cast == '1/1':
-                    observed_sequence.append('not_equal')
-                else:
-                    observed_sequence.append('equal')
-            elif (b6_ug is None or b6_ug == '0/0') and (pup2_ug is None or pup2_ug == '0/0'):
-                if known_cast == '1/1':
-                    observed_sequence.append('not_equal')
-                else:
-                    observed_sequence.append('equal')
-            else:
-                observed_sequence.append('equal')
-        elif pup1_ug == '1/1':
-            if pup2_ug in {'0/1', '1/1'} and known_cast == '1/1':
-                observed_sequence.append('not_equal')
-            elif pup2_ug in {'0/1', '1/1'} and known_cast != '1/1':
-                observed_sequence.append('equal')
-            else:
-                observed_sequence.append('equal')
-        elif pup1_ug == '0/0':
-            observed_sequence.append('equal')
+    # decode through the variant server if one is running, otherwise load the VCFs here
+    results = query_server([{'op': 'decode', 'b6': b6_father_vcf, 'pup1': pup1_vcf, 'pup2': pup2_vcf,
+                             'known_cast': known_cast_vcf, 'chromosome': chromosome}])
+    if results is not None:
+        positions = results[0]['positions']
+        most_likely_states = results[0]['states']
+        b6_positions = results[0]['b6_positions']
+        print(f"Decoded {len(positions)} pup1 positions through the variant server", file=sys.stderr)
+    else:
+        b6_snps = load_snp_store(b6_father_vcf, chromosome)
+        pup1_snps = load_snp_store(pup1_vcf, chromosome)
+        pup2_snps = load_snp_store(pup2_vcf, chromosome)
+        known_cast_snps = load_snp_store(known_cast_vcf, chromosome)
 
-        if pos in {4073346, 3194487, 3175966}:
-            print(f"Observation appended for position {pos}: {observed_sequence[-1]}", file=sys.stderr)
-    
-    print(f"Total positions in pup1: {len(pup1_snps)}", file=sys.stderr)
-    print(f"Observed sequence: {observed_sequence[:1000]}", file=sys.stderr)
+        print(f"Loaded {len(b6_snps)} SNPs from B6 father VCF", file=sys.stderr)
+        print(f"Loaded {len(pup1_snps)} SNPs from pup1 VCF", file=sys.stderr)
+        print(f"Loaded {len(pup2_snps)} SNPs from pup2 VCF", file=sys.stderr)
+        print(f"Loaded {len(known_cast_snps)} SNPs from known CAST VCF", file=sys.stderr)
 
-    start_prob = {state: 1/len(states) for state in states}
+        states, trans_prob, emit_prob = initialize_hmm_parameters()
 
-    most_likely_states = viterbi(observed_sequence, states, start_prob, trans_prob, emit_prob)
-    
-    print(f"Most likely states: {most_likely_states[:1000]}", file=sys.stderr)
-    print(f"Total most likely states: {len(most_likely_states)}", file=sys.stderr)
+        positions, observed_sequence = observation_sequence(b6_snps, pup1_snps, pup2_snps, known_cast_snps)
+
+        print(f"Total positions in pup1: {len(pup1_snps)}", file=sys.stderr)
+        print(f"Observed sequence: {observed_sequence[:1000]}", file=sys.stderr)
+
+        start_prob = {state: 1/len(states) for state in states}
+
+        most_likely_states = viterbi(observed_sequence, states, start_prob, trans_prob, emit_prob)
+
+        print(f"Most likely states: {most_likely_states[:1000]}", file=sys.stderr)
+        print(f"Total most likely states: {len(most_likely_states)}", file=sys.stderr)
+
+        b6_positions = identify_b6_positions(positions, most_likely_states)
+
+    if states_output:
+        write_hmm_states(states_output, chromosome, positions, most_likely_states)
 
-    b6_positions = identify_b6_positions(pup1_snps, most_likely_states)
-    
     print(f"B6 positions: {b6_positions[:1000]}", file=sys.stderr)
     print(f"Total B6 positions: {len(b6_positions)}", file=sys.stderr)
 
@@ -1,25 +1,100 @@
 import sys
 import gzip
+
+import numpy as np
 # this script takes in a bed file and a vcf file and outputs a new vcf file with positions defined in the bed file
 def read_bed_file(bed_file):
-    positions = set()
+    """
+    Reads target positions into sorted, non-overlapping intervals per chromosome.
+
+    Two-column lines (chromosome, position), as written by hmm.py, are single VCF
+    positions. Three-column lines are BED intervals, 0-based and half-open, so they
+    cover VCF positions start + 1 to end.
+
+    Returns:
+        Dict[str, Tuple[numpy.ndarray, numpy.ndarray]]: For each chromosome, int64 arrays
+        of interval starts and ends as 1-based inclusive VCF positions.
+    """
+    starts = {}
+    ends = {}
     with open(bed_file, 'r') as bf:
         for line in bf:
-            chrom, pos = line.strip().split()
-            positions.add((chrom, int(pos)))
-    return positions
+            parts = line.split()
+            if not parts or parts[0].startswith(('#', 'track', 'browser')):
+                continue
+            chrom = parts[0]
+            if chrom not in starts:
+                starts[chrom] = []
+                ends[chrom] = []
+            if len(parts) == 2:
+                starts[chrom].append(int(parts[1]))
+                ends[chrom].append(int(parts[1]))
+            else:
+                starts[chrom].append(int(parts[1]) + 1)
+                ends[chrom].append(int(parts[2]))
+
+    targets = {}
+    for chrom in starts:
+        chrom_starts = np.array(starts[chrom], dtype=np.int64)
+        chrom_ends = np.array(ends[chrom], dtype=np.int64)
+        order = np.argsort(chrom_starts, kind='stable')
+        chrom_starts = chrom_starts[order]
+        chrom_ends = np.maximum.accumulate(chrom_ends[order])
+        # merge intervals that overlap or touch the previous one
+        new_run = np.ones(len(chrom_starts), dtype=bool)
+        new_run[1:] = chrom_starts[1:] > chrom_ends[:-1] + 1
+        run_ends = np.append(np.flatnonzero(new_run)[1:] - 1, len(chrom_starts) - 1)
+        targets[chrom] = (chrom_starts[new_run], chrom_ends[run_ends])
+    return targets
+
+def extract_variants(vcf_file, targets, output_file):
+    """
+    Writes the header and the records of a coordinate-sorted VCF that fall in the targets.
 
-def extract_variants(vcf_file, positions, output_file):
+    The VCF is walked once alongside the sorted target intervals of its current
+    chromosome. Lines of chromosomes without targets, or past the last target of their
+    chromosome, are skipped without being split, and reading stops once every
+    chromosome's targets have been passed.
+
+    Returns:
+        int: Number of records written.
+    """
+    remaining = set(targets)
+    written = 0
+    current_chrom = None
+    starts = ends = []
+    i = n = 0
     with gzip.open(vcf_file, 'rt') as vf, gzip.open(output_file, 'wt') as of:
         for line in vf:
             if line.startswith('#'):
                 of.write(line)
-            else:
-                parts = line.strip().split('\t')
-                chrom = parts[0]
-                pos = int(parts[1])
-                if (chrom, pos) in positions:
-                    of.write(line)
+                continue
+            if not remaining:
+                break
+
+            chrom = line[:line.find('\t')]
+            if chrom != current_chrom:
+                current_chrom = chrom
+                if chrom in remaining:
+                    starts = targets[chrom][0].tolist()
+                    ends = targets[chrom][1].tolist()
+                else:
+                    starts = ends = []
+                i = 0
+                n = len(starts)
+            if i >= n:
+                continue
+
+            pos = int(line.split('\t', 2)[1])
+            while i < n and ends[i] < pos:
+                i += 1
+            if i >= n:
+                remaining.discard(chrom)
+                continue
+            if starts[i] <= pos:
+                of.write(line)
+                written += 1
+    return written
 
 def main():
     if len(sys.argv) != 4:
@@ -30,8 +105,8 @@ def main():
     bed_file = sys.argv[2]
     output_file = sys.argv[3]
 
-    positions = read_bed_file(bed_file)
-    extract_variants(vcf_file, positions, output_file)
+    targets = read_bed_file(bed_file)
+    extract_variants(vcf_file, targets, output_file)
 
 if __name__ == "__main__":
     main()
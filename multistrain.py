@@ -0,0 +1,165 @@
+import sys
+import json
+import time
+
+import numpy as np
+
+from genotypes import GT_HET, GT_HOM_ALT
+from hmm import viterbi_matrices, state_segments
+from snpstore import load_snp_store
+
+# this script decodes pup ancestry over K founder strains, generalising the two-state
+# B6/CAST model of hmm.py to transition and emission matrices read from a config file
+NO_STRAIN = 'none'
+
+class StrainHMM:
+    """
+    HMM over K founder states with K x K transition and K x M emission matrices.
+
+    Probabilities are kept as log arrays. observations names the M emission columns:
+    NO_STRAIN for a site that does not point to a single strain, and one column per
+    strain whose private alternate alleles are observed.
+    """
+
+    def __init__(self, states, observations, start, transition, emission):
+        self.states = list(states)
+        self.observations = list(observations)
+        self.log_start = np.log(np.asarray(start, dtype=float))
+        self.log_trans = np.log(np.asarray(transition, dtype=float))
+        self.log_emit = np.log(np.asarray(emission, dtype=float))
+
+        n_states = len(self.states)
+        if self.log_trans.shape != (n_states, n_states):
+            raise ValueError(f"transition must be {n_states} x {n_states}, got {self.log_trans.shape}")
+        if self.log_emit.shape != (n_states, len(self.observations)):
+            raise ValueError(f"emission must be {n_states} x {len(self.observations)}, got {self.log_emit.shape}")
+        if NO_STRAIN not in self.observations:
+            raise ValueError(f"observations must include '{NO_STRAIN}'")
+
+    def decode(self, observation_codes, mask=None):
+        """
+        Returns the state index path of each row of a pups x sites observation matrix.
+        """
+        return viterbi_matrices(np.atleast_2d(observation_codes), mask, self.log_start, self.log_trans, self.log_emit)
+
+def load_hmm_config(config_file):
+    """
+    Reads a StrainHMM from a JSON config.
+
+    The config holds "states" (K names), "observations" (M names, NO_STRAIN plus strain
+    names), "start" (K probabilities), "transition" (K x K, rows are the previous state)
+    and "emission" (K x M). If "start" is missing the states start with equal probability.
+
+    Returns:
+        StrainHMM: The model.
+    """
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    n_states = len(config['states'])
+    start = config.get('start', [1 / n_states] * n_states)
+    return StrainHMM(config['states'], config['observations'], start, config['transition'], config['emission'])
+
+def default_strain_hmm(states, switch_prob=0.005, match_prob=0.98):
+    """
+    Builds a StrainHMM with one state per strain and symmetric parameters.
+
+    Every state stays with probability 1 - switch_prob and moves to each other state with
+    an equal share of switch_prob. A site private to strain k is emitted by state k with
+    match_prob, and NO_STRAIN sites are equally likely in every state. With two states this
+    gives the same switching rate as hmm.initialize_hmm_parameters.
+
+    Args:
+        states (List[str]): Strain names, the reference strain included.
+        switch_prob (float): Probability of leaving a state at each site.
+        match_prob (float): Probability that a private site of a strain is emitted by it.
+
+    Returns:
+        StrainHMM: The model.
+    """
+    n_states = len(states)
+    if n_states < 2:
+        raise ValueError("a strain HMM needs at least two states")
+    observations = [NO_STRAIN] + list(states)
+    transition = np.full((n_states, n_states), switch_prob / (n_states - 1))
+    np.fill_diagonal(transition, 1 - switch_prob)
+
+    emission = np.empty((n_states, len(observations)))
+    emission[:, 1:] = (1 - match_prob) / (n_states - 1)
+    np.fill_diagonal(emission[:, 1:], match_prob)
+    emission[:, 1:] *= 0.5
+    emission[:, 0] = 0.5
+    return StrainHMM(states, observations, [1 / n_states] * n_states, transition, emission)
+
+def strain_observations(pup_snps, strain_snps, observations):
+    """
+    Builds the multi-category observation at every pup site.
+
+    A site where the pup carries the alternate allele (0/1 or 1/1) and exactly one of the
+    known strains is 1/1 is observed as that strain. Every other site is NO_STRAIN.
+
+    Args:
+        pup_snps (SNPStore): Pup genotypes on one chromosome.
+        strain_snps (Dict[str, SNPStore]): Genotypes of each known strain on that chromosome.
+        observations (List[str]): Emission column names of the model.
+
+    Returns:
+        numpy.ndarray: Observation index of each pup site, in pup_snps.positions order.
+    """
+    positions = pup_snps.positions
+    names = list(strain_snps)
+    carriers = np.stack([strain_snps[name].codes_at(positions) == GT_HOM_ALT for name in names])
+    pup_alt = (pup_snps.codes == GT_HET) | (pup_snps.codes == GT_HOM_ALT)
+    private = pup_alt & (carriers.sum(axis=0) == 1)
+
+    column = np.array([observations.index(name) if name in observations else observations.index(NO_STRAIN)
+                       for name in names])
+    codes = np.full(len(positions), observations.index(NO_STRAIN), dtype=np.intp)
+    codes[private] = column[carriers[:, private].argmax(axis=0)]
+    return codes
+
+def benchmark(n_sites=200000, state_counts=(2, 4, 8), seed=0):
+    """
+    Times decoding of random observations for several numbers of states.
+
+    Returns:
+        List[Tuple[int, float]]: (K, seconds per million sites) for each K.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for n_states in state_counts:
+        model = default_strain_hmm([f"S{i}" for i in range(n_states)])
+        observations = rng.integers(0, len(model.observations), size=(1, n_sites))
+        start = time.perf_counter()
+        model.decode(observations)
+        elapsed = time.perf_counter() - start
+        results.append((n_states, elapsed * 1e6 / n_sites))
+    return results
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == 'benchmark':
+        n_sites = int(sys.argv[2]) if len(sys.argv) == 3 else 200000
+        for n_states, seconds in benchmark(n_sites):
+            print(f"K={n_states}\t{seconds:.3f} s per million sites")
+        return
+
+    if len(sys.argv) < 5:
+        print("Usage: python multistrain.py <config.json> <pup_vcf> <chromosome> <strain>=<strain_vcf> [<strain>=<strain_vcf> ...]")
+        print("       python multistrain.py benchmark [n_sites]")
+        sys.exit(1)
+
+    model = load_hmm_config(sys.argv[1])
+    pup_vcf = sys.argv[2]
+    chromosome = sys.argv[3]
+    strain_vcfs = dict(arg.split('=', 1) for arg in sys.argv[4:])
+
+    pup_snps = load_snp_store(pup_vcf, chromosome)
+    strain_snps = {name: load_snp_store(path, chromosome) for name, path in strain_vcfs.items()}
+
+    observation_codes = strain_observations(pup_snps, strain_snps, model.observations)
+    path = model.decode(observation_codes)[0] if len(observation_codes) else np.array([], dtype=np.int16)
+
+    for start, end, state in state_segments(pup_snps.positions, path, model.states):
+        print(f"{chromosome}\t{start}\t{end}\t{state}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import sys
+import gzip
+import os
+from array import array
+
+import numpy as np
+
+from genotypes import GT_MISSING, GT_LABELS, genotype_code
+
+class SNPStore:
+    """
+    Genotypes of one sample on one chromosome, kept as parallel NumPy arrays.
+
+    positions is a sorted int32 array and codes the uint8 genotype code (see genotypes.py)
+    at each position. offsets, if loaded, holds the byte offset of each record in the
+    uncompressed VCF text so the raw line can be read back on demand.
+
+    The extraction scripts (hmmtestsnp.py) do not use it: they copy whole records from a
+    sorted VCF selected by position alone, so streaming them already holds no genotypes.
+    """
+
+    def __init__(self, positions, codes, offsets=None, source=None):
+        self.positions = positions
+        self.codes = codes
+        self.offsets = offsets
+        self.source = source
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        """
+        Yields (position, genotype code) pairs in position order.
+        """
+        return zip(self.positions.tolist(), self.codes.tolist())
+
+    def __contains__(self, pos):
+        return self.index(pos) is not None
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes + self.codes.nbytes + (self.offsets.nbytes if self.offsets is not None else 0)
+
+    def keys(self):
+        return self.positions.tolist()
+
+    def index(self, pos):
+        """
+        Returns the array index of pos, or None if the store has no record there.
+        """
+        i = int(np.searchsorted(self.positions, pos))
+        if i < len(self.positions) and self.positions[i] == pos:
+            return i
+        return None
+
+    def get(self, pos, default=GT_MISSING):
+        """
+        Returns the genotype code at pos, or default if there is no record.
+        """
+        i = self.index(pos)
+        return default if i is None else int(self.codes[i])
+
+    def genotype(self, pos):
+        """
+        Returns the genotype label at pos ('0/0', '0/1', '1/1', 'other' or None).
+        """
+        return GT_LABELS[self.get(pos)]
+
+    def codes_at(self, positions):
+        """
+        Looks up the genotype codes of many positions at once.
+
+        Args:
+            positions (array-like): Sorted or unsorted positions.
+
+        Returns:
+            numpy.ndarray: uint8 codes, GT_MISSING where the store has no record.
+        """
+        positions = np.asarray(positions)
+        result = np.full(len(positions), GT_MISSING, dtype=np.uint8)
+        if len(self.positions) == 0:
+            return result
+        idx = np.searchsorted(self.positions, positions)
+        idx[idx == len(self.positions)] = 0
+        found = self.positions[idx] == positions
+        result[found] = self.codes[idx[found]]
+        return result
+
+    def read_line(self, pos):
+        """
+        Reads the raw VCF line of the record at pos from the source file.
+
+        Requires the store to have been loaded with offsets. Seeking in a .gz source
+        decompresses up to the offset, so this is meant for a few lookups only.
+        """
+        if self.offsets is None:
+            raise ValueError("SNPStore was loaded without offsets")
+        i = self.index(pos)
+        if i is None:
+            return None
+        opener = gzip.open if self.source.endswith('.gz') else open
+        with opener(self.source, 'rb') as f:
+            f.seek(int(self.offsets[i]))
+            return f.readline().decode().rstrip('\n')
+
+def _build_store(positions, codes, offsets, source):
+    positions = np.frombuffer(positions, dtype=np.int32)
+    codes = np.frombuffer(codes, dtype=np.uint8)
+    offsets = np.frombuffer(offsets, dtype=np.int64) if offsets is not None else None
+
+    if np.any(positions[1:] <= positions[:-1]):
+        order = np.argsort(positions, kind='stable')
+        positions = positions[order]
+        # keep the last record of each run of equal positions
+        keep = np.append(positions[1:] != positions[:-1], True)
+        order = order[keep]
+        positions = positions[keep]
+        codes = codes[order]
+        offsets = offsets[order] if offsets is not None else None
+
+    return SNPStore(positions, codes, offsets, source)
+
+def empty_snp_store(source=None, with_offsets=False):
+    """
+    Returns a SNPStore without records, for a chromosome that a VCF does not cover.
+    """
+    return _build_store(array('i'), array('B'), array('q') if with_offsets else None, source)
+
+def load_snp_stores(file_path, with_offsets=False, unphase=False, chromosome=None):
+    """
+    Loads the genotypes of a single-sample VCF into one SNPStore per chromosome.
+
+    The genotype is taken from the UG field if present, otherwise from GT, as in
+    hmm.load_vcf. If a position occurs more than once the last record is kept.
+
+    Args:
+        file_path (str): Path to the VCF file, optionally gzipped.
+        with_offsets (bool): Also record the byte offset of each record.
+        unphase (bool): Passed to genotypes.genotype_code.
+        chromosome (str): Only load this chromosome.
+
+    Returns:
+        Dict[str, SNPStore]: Stores keyed by chromosome.
+    """
+    if not os.path.exists(file_path):
+        print(f"Error: The file {file_path} does not exist.", file=sys.stderr)
+        sys.exit(1)
+
+    columns = {}
+    chrom_prefix = (chromosome + '\t').encode() if chromosome is not None else b''
+    offset = 0
+    with gzip.open(file_path, 'rb') if file_path.endswith('.gz') else open(file_path, 'rb') as file:
+        for line in file:
+            line_offset = offset
+            offset += len(line)
+            if line.startswith(b'#') or not line.startswith(chrom_prefix):
+                continue
+            parts = line.rstrip(b'\r\n').split(b'\t')
+            pos = int(parts[1])
+            format_fields = parts[8].split(b':')
+            sample_fields = parts[9].split(b':')
+
+            if b'UG' in format_fields:
+                genotype = sample_fields[format_fields.index(b'UG')]
+            elif b'GT' in format_fields:
+                genotype = sample_fields[format_fields.index(b'GT')]
+            else:
+                print(f"Error: 'UG' or 'GT' field not found in format for position {pos} in {file_path}", file=sys.stderr)
+                continue
+
+            chrom = parts[0].decode()
+            if chrom not in columns:
+                columns[chrom] = (array('i'), array('B'), array('q') if with_offsets else None)
+            positions, codes, offsets = columns[chrom]
+            positions.append(pos)
+            codes.append(genotype_code(genotype.decode(), unphase))
+            if with_offsets:
+                offsets.append(line_offset)
+
+    stores = {chrom: _build_store(*arrays, file_path) for chrom, arrays in columns.items()}
+    print(f"Loaded {sum(len(store) for store in stores.values())} positions from {file_path}", file=sys.stderr)
+    return stores
+
+def load_snp_store(file_path, chromosome, with_offsets=False, unphase=False):
+    """
+    Loads the genotypes of one chromosome from a single-sample VCF into a SNPStore.
+
+    See load_snp_stores for how records are read.
+
+    Returns:
+        SNPStore: The loaded genotypes, empty if the chromosome has no records.
+    """
+    stores = load_snp_stores(file_path, with_offsets, unphase, chromosome)
+    if chromosome in stores:
+        return stores[chromosome]
+    return empty_snp_store(file_path, with_offsets)
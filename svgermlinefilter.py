@@ -1,5 +1,7 @@
 import sys
 
+from columnar import is_columnar_path, write_vcf_table
+
 def read_bed(file):
     """
     Reads the BED file and returns a list of dictionaries, each representing a BED entry.
@@ -108,7 +110,12 @@ def main(bed_file, vcf_file, output_file):
     # Filter the VCF data
     filtered_vcf_data = filter_vcf(bed_data, vcf_data, 10)
 
-    # Write the filtered VCF data to the output file
+    # Write the filtered VCF data to the output file, as a table for .parquet or .arrow outputs
+    if is_columnar_path(output_file):
+        sample_names = [line.split('\t')[9:] for line in vcf_header if line.startswith('#CHROM')][0]
+        write_vcf_table(output_file, sample_names, filtered_vcf_data)
+        return
+
     with open(output_file, 'w') as f:
         for line in vcf_header:
             f.write(line + '\n')
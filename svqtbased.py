@@ -1,5 +1,7 @@
 import sys
 
+from columnar import is_columnar_path, write_vcf_table
+
 def read_vcf(path):
     """
     Read a VCF file and extract data, including metadata lines starting with '##'.
@@ -58,7 +60,11 @@ def filter_vcf(vcf_data):
 def save_filtered_vcf(metadata, filtered_data, output_path):
     """
     Saves the filtered VCF data to a new file, including metadata headers.
+    A .parquet or .arrow output path writes the records as a table instead.
     """
+    if is_columnar_path(output_path):
+        write_vcf_table(output_path, ['father', 'pup1', 'pup2'], filtered_data)
+        return
     with open(output_path, 'w') as file:
         for line in metadata:
             file.write(line + '\n')
@@ -0,0 +1,83 @@
+import freebayesparallel
+
+
+def stub_caller(reference, bam, targets_bed, output_vcf, variant_input=None):
+    # one record every 50 bp of each target, plus one just past its end as a boundary spill
+    with open(output_vcf, 'w') as out:
+        out.write('##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ts\n')
+        with open(targets_bed, 'r') as bed:
+            for line in bed:
+                chrom, start, end = line.split()
+                for pos in list(range(int(start) + 1, int(end) + 1, 50)) + [int(end) + 1]:
+                    out.write(f"{chrom}\t{pos}\t.\tA\tT\t50\t.\t.\tGT\t0/1\n")
+
+
+def read_records(vcf_file):
+    with open(vcf_file, 'r') as vcf:
+        return [tuple(line.split('\t')[:2]) for line in vcf if not line.startswith('#')]
+
+
+def expected_records(regions):
+    records = set()
+    for chrom, start, end in regions:
+        for pos in list(range(start + 1, end + 1, 50)) + [end + 1]:
+            records.add((chrom, str(pos)))
+    order = freebayesparallel.contig_order(regions)
+    return sorted(records, key=lambda r: (order[r[0]], int(r[1])))
+
+
+def write_fai(tmp_path):
+    fai = tmp_path / 'ref.fa.fai'
+    fai.write_text('chr1\t1000\t6\t60\t61\nchr2\t500\t1030\t60\t61\n')
+    return str(fai)
+
+
+def test_make_shards_covers_regions_in_order():
+    regions = [('chr1', 0, 1000), ('chr2', 0, 500)]
+    shards = freebayesparallel.make_shards(regions, 4)
+    pieces = [piece for shard in shards for piece in shard]
+    assert sum(end - start for _, start, end in pieces) == 1500
+    assert pieces == sorted(pieces, key=lambda r: (r[0], r[1]))
+    assert max(sum(e - s for _, s, e in shard) for shard in shards) <= 375
+
+
+def test_run_sharded_merges_sorted_without_duplicates(tmp_path):
+    fai = write_fai(tmp_path)
+    output = str(tmp_path / 'out.vcf')
+    written = freebayesparallel.run_sharded('ref.fa', 'in.bam', fai, output, str(tmp_path / 'work'), 2, caller=stub_caller)
+
+    records = read_records(output)
+    assert written == len(records)
+    assert len(set(records)) == len(records)
+    positions = [(r[0], int(r[1])) for r in records]
+    assert positions == sorted(positions, key=lambda r: ({'chr1': 0, 'chr2': 1}[r[0]], r[1]))
+
+
+def test_rerun_with_other_worker_count_does_not_reuse_other_shards(tmp_path):
+    fai = write_fai(tmp_path)
+    work_dir = str(tmp_path / 'work')
+    first = str(tmp_path / 'first.vcf')
+    second = str(tmp_path / 'second.vcf')
+    third = str(tmp_path / 'third.vcf')
+
+    freebayesparallel.run_sharded('ref.fa', 'in.bam', fai, first, work_dir, 2, caller=stub_caller)
+    freebayesparallel.run_sharded('ref.fa', 'in.bam', fai, second, work_dir, 4, caller=stub_caller)
+    freebayesparallel.run_sharded('ref.fa', 'in.bam', fai, third, work_dir, 2, caller=stub_caller)
+
+    for output, n_workers in ((first, 2), (second, 4), (third, 2)):
+        shards = freebayesparallel.make_shards(freebayesparallel.read_regions(fai), 4 * n_workers)
+        pieces = [piece for shard in shards for piece in shard]
+        assert read_records(output) == expected_records(pieces)
+    assert read_records(first) == read_records(third)
+
+
+def test_finished_shards_are_skipped(tmp_path):
+    fai = write_fai(tmp_path)
+    work_dir = tmp_path / 'work'
+    output = str(tmp_path / 'out.vcf')
+    freebayesparallel.run_sharded('ref.fa', 'in.bam', fai, output, str(work_dir), 2, caller=stub_caller)
+    before = {path.name: path.stat().st_mtime_ns for path in work_dir.glob('*.vcf')}
+
+    freebayesparallel.run_sharded('ref.fa', 'in.bam', fai, output, str(work_dir), 2, caller=stub_caller)
+    after = {path.name: path.stat().st_mtime_ns for path in work_dir.glob('*.vcf')}
+    assert before == after
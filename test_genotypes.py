@@ -0,0 +1,75 @@
+import itertools
+
+import numpy as np
+
+from genotypes import (GT_MISSING, GT_HOM_REF, GT_HET, GT_HOM_ALT, GT_OTHER, N_GT_CODES, OBS_LABELS, OBS_NONE,
+                       OBSERVATION_TABLE, encode_observations, genotype_code)
+
+# genotype strings as load_vcf in hmm.py returns them, None where the VCF has no record
+GENOTYPES = [None, '0/0', '0/1', '1/1', './.', '.', '0|0', '0|1', '1|0', '1|1', '1/2', '0/2']
+
+# one genotype string for every code
+CODE_STRINGS = {GT_MISSING: None, GT_HOM_REF: '0/0', GT_HET: '0/1', GT_HOM_ALT: '1/1', GT_OTHER: './.'}
+
+
+def original_observation(pup1_ug, b6_ug, pup2_ug, known_cast):
+    # the observation loop of hmm.py before genotypes were encoded, returns None if it appends nothing
+    observed_sequence = []
+    if pup1_ug == '0/1':
+        if (b6_ug is None) and (pup2_ug == '0/1'):
+            if known_cast == '1/1':
+                observed_sequence.append('not_equal')
+            else:
+                observed_sequence.append('equal')
+        elif (b6_ug is None or b6_ug == '0/0') and (pup2_ug is None or pup2_ug == '0/0'):
+            if known_cast == '1/1':
+                observed_sequence.append('not_equal')
+            else:
+                observed_sequence.append('equal')
+        else:
+            observed_sequence.append('equal')
+    elif pup1_ug == '1/1':
+        if pup2_ug in {'0/1', '1/1'} and known_cast == '1/1':
+            observed_sequence.append('not_equal')
+        elif pup2_ug in {'0/1', '1/1'} and known_cast != '1/1':
+            observed_sequence.append('equal')
+        else:
+            observed_sequence.append('equal')
+    elif pup1_ug == '0/0':
+        observed_sequence.append('equal')
+    return observed_sequence[0] if observed_sequence else None
+
+
+def label(observation):
+    return None if observation == OBS_NONE else OBS_LABELS[observation]
+
+
+def test_table_matches_original_rules_for_every_code():
+    for codes in itertools.product(range(N_GT_CODES), repeat=4):
+        strings = [CODE_STRINGS[code] for code in codes]
+        assert label(OBSERVATION_TABLE[codes]) == original_observation(*strings), (codes, strings)
+
+
+def test_encoded_observations_match_original_rules_for_genotype_strings():
+    combos = list(itertools.product(GENOTYPES, repeat=4))
+    codes = np.array([[genotype_code(gt) for gt in combo] for combo in combos], dtype=np.uint8)
+    observations = encode_observations(*codes.T)
+    for combo, observation in zip(combos, observations):
+        assert label(observation) == original_observation(*combo), combo
+
+
+def test_genotype_code():
+    assert genotype_code(None) == GT_MISSING
+    assert [genotype_code(gt) for gt in ('0/0', '0/1', '1/1')] == [GT_HOM_REF, GT_HET, GT_HOM_ALT]
+    for gt in ('./.', '.', '0|0', '0|1', '1|0', '1|1', '1/2'):
+        assert genotype_code(gt) == GT_OTHER, gt
+
+
+def test_genotype_code_unphase():
+    assert genotype_code('0|0', unphase=True) == GT_HOM_REF
+    assert genotype_code('0|1', unphase=True) == GT_HET
+    assert genotype_code('1|0', unphase=True) == GT_HET
+    assert genotype_code('1|1', unphase=True) == GT_HOM_ALT
+    assert genotype_code('./.', unphase=True) == GT_OTHER
+    assert genotype_code('1|2', unphase=True) == GT_OTHER
+    assert genotype_code(None, unphase=True) == GT_MISSING
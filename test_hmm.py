@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from hmm import initialize_hmm_parameters, viterbi, viterbi_batch, viterbi_stream
+
+LABELS = ['equal', 'not_equal']
+
+
+def hmm_parameters():
+    states, trans_prob, emit_prob = initialize_hmm_parameters()
+    start_prob = {state: 1/len(states) for state in states}
+    return states, start_prob, trans_prob, emit_prob
+
+
+def random_sequences(seed, n_sequences=100, max_length=300):
+    rng = np.random.default_rng(seed)
+    return [rng.choice(LABELS, size=int(rng.integers(1, max_length)), p=[0.6, 0.4]).tolist()
+            for _ in range(n_sequences)]
+
+
+def stream_states(observations, parameters, lag):
+    decoded = list(viterbi_stream(enumerate(observations), *parameters, lag=lag))
+    assert [pos for pos, _ in decoded] == list(range(len(observations)))
+    return [state for _, state in decoded]
+
+
+def test_batch_matches_viterbi():
+    parameters = hmm_parameters()
+    states = parameters[0]
+    for observations in random_sequences(0):
+        expected = viterbi(observations, *parameters)
+        path = viterbi_batch([observations, observations], None, *parameters)
+        assert [[states[i] for i in row] for row in path.tolist()] == [expected, expected]
+
+
+@pytest.mark.parametrize('lag', [10000, 32])
+def test_stream_matches_viterbi(lag):
+    parameters = hmm_parameters()
+    for observations in random_sequences(1):
+        assert stream_states(observations, parameters, lag) == viterbi(observations, *parameters)
+
+
+def test_stream_with_tiny_lag_decodes_every_site():
+    # paths rarely merge within 2 sites, so the states may differ from viterbi
+    parameters = hmm_parameters()
+    for observations in random_sequences(2, n_sequences=20):
+        assert set(stream_states(observations, parameters, 2)) <= set(parameters[0])
+
+
+def test_stream_missing_calls_match_masked_batch():
+    parameters = hmm_parameters()
+    states = parameters[0]
+    rng = np.random.default_rng(3)
+    for observations in random_sequences(3, n_sequences=20):
+        mask = rng.random(len(observations)) < 0.2
+        with_gaps = [None if missing else label for label, missing in zip(observations, mask)]
+        path = viterbi_batch([observations], [mask], *parameters)[0]
+        assert stream_states(with_gaps, parameters, 10000) == [states[i] for i in path.tolist()]
+
+
+@pytest.mark.parametrize('observation', [None, 'B6', 'unknown'])
+def test_unknown_labels_raise(observation):
+    parameters = hmm_parameters()
+    with pytest.raises(ValueError):
+        viterbi_batch([['equal', observation]], None, *parameters)
+    if observation is not None:
+        with pytest.raises(ValueError):
+            list(viterbi_stream([(1, 'equal'), (2, observation)], *parameters))
@@ -0,0 +1,204 @@
+import sys
+import gzip
+from array import array
+
+import numpy as np
+
+from genotypes import GT_MISSING, GT_HOM_REF, GT_HET, GT_HOM_ALT, GT_LABELS, N_GT_CODES, genotype_code
+from snpstore import load_snp_stores
+
+# this script computes Mendelian consistency and genotype concordance between the father
+# and the two pups, per chromosome and per window, before de novo calls are trusted
+SAMPLES = ['father', 'pup1', 'pup2']
+CALLED = (GT_HOM_REF, GT_HET, GT_HOM_ALT)
+
+class TrioGenotypes:
+    """
+    Genotype codes of father, pup1 and pup2 aligned on the same sites of one chromosome.
+
+    positions is a sorted int32 array and father, pup1 and pup2 are uint8 code arrays
+    (see genotypes.py) of the same length, GT_MISSING where a sample has no record.
+    """
+
+    def __init__(self, chromosome, positions, father, pup1, pup2):
+        self.chromosome = chromosome
+        self.positions = positions
+        self.father = father
+        self.pup1 = pup1
+        self.pup2 = pup2
+
+    def __len__(self):
+        return len(self.positions)
+
+def merge_trio(father_vcf, pup1_vcf, pup2_vcf):
+    """
+    Loads three single-sample VCFs and aligns them on the union of their positions.
+    Phased calls are read as their unphased genotype.
+
+    Returns:
+        Dict[str, TrioGenotypes]: Aligned genotypes keyed by chromosome.
+    """
+    stores = [load_snp_stores(path, unphase=True) for path in (father_vcf, pup1_vcf, pup2_vcf)]
+    chromosomes = []
+    for sample_stores in stores:
+        chromosomes += [chrom for chrom in sample_stores if chrom not in chromosomes]
+
+    trio = {}
+    for chrom in chromosomes:
+        sample_stores = [s[chrom] for s in stores if chrom in s]
+        positions = sample_stores[0].positions
+        for store in sample_stores[1:]:
+            positions = np.union1d(positions, store.positions)
+        codes = [s[chrom].codes_at(positions) if chrom in s else np.full(len(positions), GT_MISSING, dtype=np.uint8)
+                 for s in stores]
+        trio[chrom] = TrioGenotypes(chrom, positions, *codes)
+    return trio
+
+def load_trio_vcf(vcf_file):
+    """
+    Loads a multi-sample VCF with father, pup1 and pup2 in the first three sample columns.
+    Phased calls are read as their unphased genotype.
+
+    Returns:
+        Dict[str, TrioGenotypes]: Genotypes keyed by chromosome.
+    """
+    columns = {}
+    with gzip.open(vcf_file, 'rt') if vcf_file.endswith('.gz') else open(vcf_file, 'r') as vcf:
+        for line in vcf:
+            if line.startswith('#'):
+                continue
+            parts = line.rstrip('\r\n').split('\t')
+            gt_index = parts[8].split(':').index('GT')
+            if parts[0] not in columns:
+                columns[parts[0]] = (array('i'), array('B'), array('B'), array('B'))
+            positions, father, pup1, pup2 = columns[parts[0]]
+            positions.append(int(parts[1]))
+            father.append(genotype_code(parts[9].split(':')[gt_index], unphase=True))
+            pup1.append(genotype_code(parts[10].split(':')[gt_index], unphase=True))
+            pup2.append(genotype_code(parts[11].split(':')[gt_index], unphase=True))
+
+    trio = {}
+    for chrom, (positions, father, pup1, pup2) in columns.items():
+        positions = np.frombuffer(positions, dtype=np.int32)
+        order = np.argsort(positions, kind='stable')
+        codes = [np.frombuffer(c, dtype=np.uint8)[order] for c in (father, pup1, pup2)]
+        trio[chrom] = TrioGenotypes(chrom, positions[order], *codes)
+    return trio
+
+def mendelian_violations(father, pup):
+    """
+    Flags sites where the pup carries none of the father's alleles.
+
+    Only the father is genotyped, so a violation is a homozygous father with a pup that is
+    homozygous for the other allele (0/0 with 1/1, or 1/1 with 0/0).
+
+    Returns:
+        numpy.ndarray: Boolean array, True at violating sites.
+    """
+    return ((father == GT_HOM_REF) & (pup == GT_HOM_ALT)) | ((father == GT_HOM_ALT) & (pup == GT_HOM_REF))
+
+def informative_sites(father, pup):
+    """
+    Returns a boolean array of sites where both samples have a 0/0, 0/1 or 1/1 call.
+    """
+    return np.isin(father, CALLED) & np.isin(pup, CALLED)
+
+def concordance_matrix(first, second):
+    """
+    Counts every combination of genotype codes between two samples.
+
+    Returns:
+        numpy.ndarray: N_GT_CODES x N_GT_CODES int64 matrix, rows are codes of first.
+    """
+    combined = first.astype(np.intp) * N_GT_CODES + second
+    return np.bincount(combined, minlength=N_GT_CODES * N_GT_CODES).reshape(N_GT_CODES, N_GT_CODES)
+
+def window_summary(trio, window_size):
+    """
+    Counts informative sites and Mendelian violations of both pups in fixed windows.
+
+    Returns:
+        List[Tuple[str, int, int, int, int, int, int]]: (chromosome, start, end,
+        pup1 informative sites, pup1 violations, pup2 informative sites, pup2 violations)
+        for every window that has at least one site. start is 0-based and end exclusive.
+    """
+    if len(trio) == 0:
+        return []
+    # VCF POS is 1-based, window b covers POS b * window_size + 1 to (b + 1) * window_size
+    bins = (trio.positions.astype(np.int64) - 1) // window_size
+    n_bins = int(bins[-1]) + 1
+    counts = []
+    for pup in (trio.pup1, trio.pup2):
+        informative = informative_sites(trio.father, pup)
+        violations = mendelian_violations(trio.father, pup)
+        counts.append(np.bincount(bins, weights=informative, minlength=n_bins).astype(np.int64))
+        counts.append(np.bincount(bins, weights=violations, minlength=n_bins).astype(np.int64))
+    sites = np.bincount(bins, minlength=n_bins)
+    return [(trio.chromosome, int(b) * window_size, (int(b) + 1) * window_size,
+             int(counts[0][b]), int(counts[1][b]), int(counts[2][b]), int(counts[3][b]))
+            for b in np.flatnonzero(sites)]
+
+def chromosome_summary(trio):
+    """
+    Returns (chromosome, sites, pup1 informative sites, pup1 violations, pup1 concordance,
+    pup2 informative sites, pup2 violations, pup2 concordance) for one chromosome.
+
+    Concordance is the fraction of informative sites where the pup has the father's genotype.
+    """
+    row = [trio.chromosome, len(trio)]
+    for pup in (trio.pup1, trio.pup2):
+        informative = informative_sites(trio.father, pup)
+        n_informative = int(informative.sum())
+        same = int((informative & (trio.father == pup)).sum())
+        row += [n_informative, int(mendelian_violations(trio.father, pup).sum()),
+                same / n_informative if n_informative else float('nan')]
+    return tuple(row)
+
+def write_summaries(trio, window_size, output_prefix):
+    """
+    Writes <prefix>.chromosomes.tsv, <prefix>.windows.tsv and <prefix>.concordance.tsv.
+    """
+    with open(output_prefix + '.chromosomes.tsv', 'w') as tsv:
+        tsv.write("Chromosome\tSites\tPup1_Informative\tPup1_Violations\tPup1_Concordance\t"
+                  "Pup2_Informative\tPup2_Violations\tPup2_Concordance\n")
+        for chrom in trio:
+            tsv.write('\t'.join(str(v) for v in chromosome_summary(trio[chrom])) + '\n')
+
+    with open(output_prefix + '.windows.tsv', 'w') as tsv:
+        tsv.write("Chromosome\tStart\tEnd\tPup1_Informative\tPup1_Violations\tPup2_Informative\tPup2_Violations\n")
+        for chrom in trio:
+            for row in window_summary(trio[chrom], window_size):
+                tsv.write('\t'.join(str(v) for v in row) + '\n')
+
+    # genome-wide genotype combinations for each pair of samples
+    pairs = [('father', 'pup1'), ('father', 'pup2'), ('pup1', 'pup2')]
+    labels = [label or 'missing' for label in GT_LABELS]
+    with open(output_prefix + '.concordance.tsv', 'w') as tsv:
+        tsv.write("First\tSecond\tFirst_GT\tSecond_GT\tCount\n")
+        for first, second in pairs:
+            matrix = sum(concordance_matrix(getattr(t, first), getattr(t, second)) for t in trio.values())
+            for i, j in zip(*np.nonzero(matrix)):
+                tsv.write(f"{first}\t{second}\t{labels[i]}\t{labels[j]}\t{matrix[i, j]}\n")
+
+def main():
+    if len(sys.argv) not in (4, 6):
+        print("Usage: python trioqc.py <father_vcf> <pup1_vcf> <pup2_vcf> <window_size> <output_prefix>")
+        print("       python trioqc.py <trio_vcf> <window_size> <output_prefix>")
+        sys.exit(1)
+
+    window_size = int(sys.argv[-2])
+    output_prefix = sys.argv[-1]
+    if window_size <= 0:
+        print(f"Error: window_size must be a positive number of bases, got {window_size}.", file=sys.stderr)
+        sys.exit(1)
+
+    if len(sys.argv) == 6:
+        trio = merge_trio(sys.argv[1], sys.argv[2], sys.argv[3])
+    else:
+        trio = load_trio_vcf(sys.argv[1])
+
+    write_summaries(trio, window_size, output_prefix)
+    print(f"Trio QC written to {output_prefix}.*.tsv")
+
+if __name__ == "__main__":
+    main()
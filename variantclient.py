@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+import socket
+import tempfile
+
+# client side of variantserver.py, kept free of heavy imports so the scripts can always load it
+DEFAULT_SOCKET = os.environ.get('VARIANT_SERVER_SOCKET') or os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), f'variantserver-{os.getuid()}.sock')
+
+def query_server(requests, socket_path=DEFAULT_SOCKET):
+    """
+    Sends a batch of requests to a running server.
+
+    Paths in the requests are made absolute before sending. A socket owned by another
+    user is never connected to, since its answers could not be trusted.
+
+    Args:
+        requests (list): Request dicts, see variantserver.RequestHandler.
+        socket_path (str): Path of the server socket.
+
+    Returns:
+        list or None: One result per request, or None if no server is listening. A request
+        that failed on the server raises RuntimeError.
+    """
+    try:
+        owner = os.stat(socket_path).st_uid
+    except FileNotFoundError:
+        return None
+    if owner != os.getuid():
+        print(f"Warning: ignoring variant server socket {socket_path} owned by uid {owner}", file=sys.stderr)
+        return None
+    for request in requests:
+        for key in ('vcf', 'b6', 'pup1', 'pup2', 'known_cast'):
+            if key in request:
+                request[key] = os.path.abspath(request[key])
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall((json.dumps({'requests': requests}) + '\n').encode())
+            with sock.makefile('rb') as response:
+                results = json.loads(response.readline())['results']
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+
+    for result in results:
+        if 'error' in result:
+            raise RuntimeError(f"variant server: {result['error']}")
+    return [result['result'] for result in results]
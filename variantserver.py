@@ -0,0 +1,253 @@
+import sys
+import os
+import gzip
+import json
+import signal
+import socketserver
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+import hmm
+from genotypes import GT_HOM_REF, GT_HET, GT_HOM_ALT, GT_LABELS, N_GT_CODES, OBS_LABELS, OBS_NONE, encode_observations, genotype_code
+from snpstore import SNPStore, load_snp_stores, empty_snp_store
+from variantclient import DEFAULT_SOCKET
+
+# this script keeps parsed VCFs in memory behind a Unix socket so count.py and hmm.py
+# can query them through variantclient.py without parsing the files again on every call
+
+class DatasetCache:
+    """
+    Parsed VCFs kept as SNPStores, evicted least recently used first.
+
+    Each dataset is one VCF path and kind mapped to its per-chromosome stores. When the total
+    size of the arrays goes over memory_budget bytes, the least recently used datasets
+    are dropped until it fits again; the dataset just loaded is always kept.
+    """
+
+    def __init__(self, memory_budget):
+        self.memory_budget = memory_budget
+        self.datasets = OrderedDict()
+        self.sizes = {}
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def get(self, path, kind='genotypes'):
+        """
+        Returns the stores of a VCF, loading them on first use.
+
+        kind is 'genotypes' for load_snp_stores or 'counts' for load_count_stores. The file
+        is parsed without holding the lock, so requests for cached datasets are answered
+        while a load is running; concurrent requests for the same file wait for one load.
+
+        Datasets are keyed on the file's modification time and size as well as its path,
+        so a file rewritten by a pipeline step is loaded again instead of served stale.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (kind, path, stat.st_mtime_ns, stat.st_size)
+        while True:
+            with self.lock:
+                if key in self.datasets:
+                    self.datasets.move_to_end(key)
+                    return self.datasets[key]
+                loading = self.loading.get(key)
+                if loading is None:
+                    loading = self.loading[key] = threading.Event()
+                    break
+            # another thread is loading this file, use its result or retry if it failed
+            loading.wait()
+
+        stores = None
+        try:
+            stores = LOADERS[kind](path)
+        finally:
+            with self.lock:
+                if stores is not None:
+                    # drop the data of earlier versions of the file
+                    for stale in [k for k in self.datasets if k[:2] == key[:2]]:
+                        del self.datasets[stale]
+                        del self.sizes[stale]
+                    self.datasets[key] = stores
+                    self.sizes[key] = sum(store.nbytes for store in stores.values())
+                    while sum(self.sizes.values()) > self.memory_budget and len(self.datasets) > 1:
+                        evicted, _ = self.datasets.popitem(last=False)
+                        del self.sizes[evicted]
+                        print(f"Evicted {evicted[1]} ({evicted[0]})", file=sys.stderr)
+                del self.loading[key]
+                loading.set()
+        return stores
+
+    def store(self, path, chromosome):
+        stores = self.get(path)
+        if chromosome in stores:
+            return stores[chromosome]
+        return empty_snp_store(path)
+
+def load_count_stores(file_path):
+    """
+    Loads a VCF for region counting with the rules of count.count_snps_in_region.
+
+    Unlike load_snp_stores, every record is kept, including repeated positions, and the
+    genotype is the first ':' field of the first sample column whatever FORMAT says.
+
+    Returns:
+        Dict[str, SNPStore]: Stores keyed by chromosome, positions sorted but not unique.
+    """
+    columns = {}
+    with gzip.open(file_path, 'rb') if file_path.endswith('.gz') else open(file_path, 'rb') as vcf:
+        for line in vcf:
+            if line.startswith(b'#'):
+                continue
+            parts = line.strip().split(b'\t')
+            chrom = parts[0].decode()
+            if chrom not in columns:
+                columns[chrom] = (array('i'), array('B'))
+            positions, codes = columns[chrom]
+            positions.append(int(parts[1]))
+            codes.append(genotype_code(parts[9].split(b':')[0].decode()))
+
+    stores = {}
+    for chrom, (positions, codes) in columns.items():
+        positions = np.frombuffer(positions, dtype=np.int32)
+        order = np.argsort(positions, kind='stable')
+        stores[chrom] = SNPStore(positions[order], np.frombuffer(codes, dtype=np.uint8)[order], source=file_path)
+    return stores
+
+LOADERS = {
+    'genotypes': load_snp_stores,
+    'counts': load_count_stores,
+}
+
+def region_counts(cache, request):
+    """
+    Counts 0/0, 0/1 and 1/1 calls in each region, with start <= pos <= end as in count.py.
+    """
+    stores = cache.get(request['vcf'], kind='counts')
+    counts = []
+    for chrom, start, end in request['regions']:
+        store = stores.get(chrom)
+        if store is None:
+            counts.append([chrom, start, end, 0, 0, 0])
+            continue
+        lo = np.searchsorted(store.positions, start, side='left')
+        hi = np.searchsorted(store.positions, end, side='right')
+        code_counts = np.bincount(store.codes[lo:hi], minlength=N_GT_CODES)
+        counts.append([chrom, start, end, int(code_counts[GT_HOM_REF]), int(code_counts[GT_HET]), int(code_counts[GT_HOM_ALT])])
+    return counts
+
+def lookup(cache, request):
+    """
+    Returns the genotype label at each position, None where there is no record.
+    """
+    store = cache.store(request['vcf'], request['chromosome'])
+    return [GT_LABELS[code] for code in store.codes_at(request['positions']).tolist()]
+
+def _trio_stores(cache, request):
+    chromosome = request['chromosome']
+    return (cache.store(request['b6'], chromosome), cache.store(request['pup1'], chromosome),
+            cache.store(request['pup2'], chromosome), cache.store(request['known_cast'], chromosome))
+
+def encode(cache, request):
+    """
+    Returns the pup1 positions and the observation at each, None where no observation is made.
+    """
+    b6_snps, pup1_snps, pup2_snps, known_cast_snps = _trio_stores(cache, request)
+    positions = pup1_snps.positions
+    codes = encode_observations(pup1_snps.codes, b6_snps.codes_at(positions),
+                                pup2_snps.codes_at(positions), known_cast_snps.codes_at(positions))
+    observations = [None if code == OBS_NONE else OBS_LABELS[code] for code in codes.tolist()]
+    return {'positions': positions.tolist(), 'observations': observations}
+
+def decode(cache, request):
+    """
+    Runs the hmm.py decoding for one chromosome.
+
+    Returns the positions that gave an observation with the decoded state of each, and the
+    B6 positions among them as hmm.py prints them.
+    """
+    b6_snps, pup1_snps, pup2_snps, known_cast_snps = _trio_stores(cache, request)
+    positions, observed_sequence = hmm.observation_sequence(b6_snps, pup1_snps, pup2_snps, known_cast_snps)
+    if not observed_sequence:
+        return {'positions': [], 'states': [], 'b6_positions': []}
+
+    states, trans_prob, emit_prob = hmm.initialize_hmm_parameters()
+    start_prob = {state: 1/len(states) for state in states}
+    path = hmm.viterbi_batch([observed_sequence], None, states, start_prob, trans_prob, emit_prob)[0]
+    most_likely_states = [states[i] for i in path.tolist()]
+    return {
+        'positions': positions,
+        'states': most_likely_states,
+        'b6_positions': hmm.identify_b6_positions(positions, most_likely_states),
+    }
+
+OPERATIONS = {
+    'region_counts': region_counts,
+    'lookup': lookup,
+    'encode': encode,
+    'decode': decode,
+}
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Reads one JSON line {"requests": [...]} and writes one JSON line {"results": [...]}.
+
+    Each request is a dict with an "op" key naming one of OPERATIONS. A failed request
+    gets {"error": message} in its result slot and does not affect the others.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        results = []
+        for request in json.loads(line)['requests']:
+            try:
+                results.append({'result': OPERATIONS[request['op']](self.server.cache, request)})
+            except Exception as e:
+                results.append({'error': f"{type(e).__name__}: {e}"})
+        self.wfile.write((json.dumps({'results': results}) + '\n').encode())
+
+class VariantServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, cache):
+        self.cache = cache
+        super().__init__(socket_path, RequestHandler)
+
+def main():
+    if len(sys.argv) not in (2, 3, 4):
+        print("Usage: python variantserver.py <memory_budget_mb> [config.json] [socket_path]")
+        sys.exit(1)
+
+    memory_budget = int(float(sys.argv[1]) * 1024 * 1024)
+    config_file = sys.argv[2] if len(sys.argv) >= 3 else None
+    socket_path = sys.argv[3] if len(sys.argv) == 4 else DEFAULT_SOCKET
+
+    cache = DatasetCache(memory_budget)
+    if config_file:
+        # the config is a JSON object with a "vcfs" list of files to load at start-up and an
+        # optional "kinds" list of LOADERS to load them as, all of them by default
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+        for path in config.get('vcfs', []):
+            for kind in config.get('kinds', list(LOADERS)):
+                cache.get(path, kind)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    # exit through the finally block below on SIGTERM so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with VariantServer(socket_path, cache) as server:
+        print(f"Serving on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import sys
+import os
+import gzip
+import heapq
+import struct
+import tempfile
+import zlib
+
+# this script sorts VCF records by contig order and position without holding the whole
+# file in memory, and writes the result BGZF-compressed so it can be indexed with tabix
+
+BGZF_BLOCK_SIZE = 0xff00
+# most chunk files open at once while merging, well under the usual limit of 1024 open files
+MERGE_FAN_IN = 64
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+class BgzfWriter:
+    """
+    Writes text as a BGZF file, the blocked gzip format used by bgzip and tabix.
+    """
+
+    def __init__(self, path, level=6):
+        self.file = open(path, 'wb')
+        self.level = level
+        self.buffer = bytearray()
+
+    def write(self, text):
+        self.buffer += text.encode()
+        while len(self.buffer) >= BGZF_BLOCK_SIZE:
+            self._write_block(bytes(self.buffer[:BGZF_BLOCK_SIZE]))
+            del self.buffer[:BGZF_BLOCK_SIZE]
+
+    def _write_block(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        # gzip header with the BC extra field holding the total block size minus one
+        header = struct.pack('<4BI2BH2BHH', 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6, ord('B'), ord('C'), 2,
+                             len(compressed) + 25)
+        self.file.write(header + compressed + struct.pack('<II', zlib.crc32(data), len(data)))
+
+    def close(self):
+        if self.buffer:
+            self._write_block(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.file.write(BGZF_EOF)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def open_vcf(path):
+    with open(path, 'rb') as f:
+        gzipped = f.read(2) == b'\x1f\x8b'
+    return gzip.open(path, 'rt') if gzipped else open(path, 'r')
+
+def read_fai_order(fai_file):
+    """
+    Returns the rank of each contig in a FASTA index.
+    """
+    order = {}
+    with open(fai_file, 'r') as fai:
+        for line in fai:
+            if line.strip():
+                order[line.split('\t', 1)[0]] = len(order)
+    return order
+
+def read_header(path):
+    """
+    Returns the header lines of a VCF and the contig ranks from its ##contig lines.
+    """
+    header = []
+    order = {}
+    with open_vcf(path) as vcf:
+        for line in vcf:
+            if not line.startswith('#'):
+                break
+            header.append(line)
+            if line.startswith('##contig=<'):
+                for field in line[len('##contig=<'):].rstrip('>\r\n').split(','):
+                    if field.startswith('ID='):
+                        order.setdefault(field[3:], len(order))
+    return header, order
+
+def write_chunk(records, tmp_dir):
+    """
+    Sorts a chunk of (key, line) records and spills it to a temporary file.
+    """
+    records.sort()
+    fd, path = tempfile.mkstemp(suffix='.vcfchunk', dir=tmp_dir)
+    with os.fdopen(fd, 'w') as chunk:
+        for (rank, pos, _), line in records:
+            chunk.write(f"{rank}\t{pos}\t{line}")
+    return path
+
+def read_chunk(path):
+    with open(path, 'r') as chunk:
+        for line in chunk:
+            rank, pos, record = line.split('\t', 2)
+            yield (int(rank), int(pos), record), record
+
+def merge_chunks(chunk_paths, tmp_dir, fan_in=MERGE_FAN_IN):
+    """
+    Merges sorted chunk files until at most fan_in are left.
+
+    The oldest fan_in chunks are merged into a new chunk at the end of the list until the
+    list is short enough, so no more than fan_in chunk files are open at any time. The list
+    is updated in place and always names the chunk files that exist, so the caller can
+    remove them if a merge fails.
+    """
+    while len(chunk_paths) > fan_in:
+        group = chunk_paths[:fan_in]
+        fd, path = tempfile.mkstemp(suffix='.vcfchunk', dir=tmp_dir)
+        chunk_paths.append(path)
+        with os.fdopen(fd, 'w') as chunk:
+            for (rank, pos, _), line in heapq.merge(*[read_chunk(group_path) for group_path in group]):
+                chunk.write(f"{rank}\t{pos}\t{line}")
+        del chunk_paths[:fan_in]
+        for group_path in group:
+            os.remove(group_path)
+
+def sort_vcf(input_vcfs, output_vcf, memory_budget, fai_file=None, dedupe=False, tmp_dir=None):
+    """
+    Sorts the records of one or more VCFs by contig order and position into a BGZF file.
+
+    Records are read into chunks of about memory_budget bytes, each chunk is sorted and
+    written to a temporary file, and the chunks are merged with a k-way merge, in several
+    passes if there are more than MERGE_FAN_IN of them (see merge_chunks). Contig order
+    comes from the .fai if given, otherwise from the ##contig lines of the first input;
+    contigs found in neither are placed after the known ones in order of first appearance.
+    The header of the first input is written unchanged.
+
+    Parameters:
+    input_vcfs (list): Paths of the input VCFs, plain or gzipped.
+    output_vcf (str): Path of the BGZF output.
+    memory_budget (int): Approximate number of bytes of records held in memory.
+    fai_file (str): Optional FASTA index giving the contig order.
+    dedupe (bool): Write only one copy of records that are identical lines.
+    tmp_dir (str): Directory for the chunk files, defaults to the system temp directory.
+
+    Returns:
+    int: Number of records written.
+    """
+    header, order = read_header(input_vcfs[0])
+    if fai_file:
+        order = read_fai_order(fai_file)
+
+    chunk_paths = []
+    records = []
+    used = 0
+    try:
+        for path in input_vcfs:
+            with open_vcf(path) as vcf:
+                for line in vcf:
+                    if line.startswith('#'):
+                        continue
+                    if not line.endswith('\n'):
+                        line += '\n'
+                    chrom, pos = line.split('\t', 2)[:2]
+                    rank = order.setdefault(chrom, len(order))
+                    records.append(((rank, int(pos), line), line))
+                    # the line plus the key tuple, the record tuple and their ints
+                    used += sys.getsizeof(line) + 200
+                    if used >= memory_budget:
+                        chunk_paths.append(write_chunk(records, tmp_dir))
+                        records = []
+                        used = 0
+
+        if chunk_paths and records:
+            chunk_paths.append(write_chunk(records, tmp_dir))
+            records = []
+        if chunk_paths:
+            merge_chunks(chunk_paths, tmp_dir)
+            merged = heapq.merge(*[read_chunk(path) for path in chunk_paths])
+        else:
+            records.sort()
+            merged = iter(records)
+
+        written = 0
+        previous = None
+        with BgzfWriter(output_vcf) as out:
+            out.write(''.join(header))
+            for _, line in merged:
+                if dedupe and line == previous:
+                    continue
+                out.write(line)
+                previous = line
+                written += 1
+    finally:
+        for path in chunk_paths:
+            os.remove(path)
+
+    return written
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    if len(args) < 3 or any(flag != '--dedupe' and not flag.startswith('--fai=') for flag in flags):
+        print("Usage: python vcfsort.py [--dedupe] [--fai=<reference.fai>] <output.vcf.gz> <memory_budget_mb> <input_vcf> [input_vcf ...]")
+        sys.exit(1)
+
+    output_vcf = args[0]
+    memory_budget = int(float(args[1]) * 1024 * 1024)
+    input_vcfs = args[2:]
+    dedupe = '--dedupe' in flags
+    fai_file = next((flag[len('--fai='):] for flag in flags if flag.startswith('--fai=')), None)
+
+    written = sort_vcf(input_vcfs, output_vcf, memory_budget, fai_file, dedupe)
+    print(f"Sorted {written} records into {output_vcf}")
+
+if __name__ == "__main__":
+    main()